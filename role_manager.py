@@ -0,0 +1,203 @@
+"""
+This module implements RoleAssignerClient which grants (or revokes) a role to white-listed members in bulk.
+
+- Discord.py API Reference: https://discordpy.readthedocs.io/en/latest/api.html#
+- Get TOKEN of your bot: https://discord.com/developers/applications, select APP -> Bot -> reveal/create Token
+
+"""
+import asyncio
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import aiohttp
+import discord
+from discord import Guild, Member, Role
+
+from common import CachedGuild, BasicClient
+
+MY_TOKEN = open('token.txt', 'r').read()
+
+
+@dataclass
+class RoleAssignmentConfig:
+    """Each JSON is either a list of Discord user IDs / names, or a dict keyed by them,
+        e.g. the discord_users_to_claim_url_map JSONs used by POAPDistributor.
+    """
+    role_id: int
+    whitelist_json_paths: List[Path]
+    remove: bool = False
+
+
+class RoleAssigner(CachedGuild):
+    """
+    - Match whitelisted user IDs / names against the cached members of the guild;
+    - Skip members already holding (or already lacking, when removing) the role;
+    - add_roles / remove_roles with bounded concurrency, back off on 5xx / network errors, stop on the first 403.
+
+    """
+    GUILD = 916300758834630666  # "Real-UnknownDAO"  # discord server name
+    MAX_CONCURRENCY = 8
+    MAX_ATTEMPTS = 2
+
+    def __init__(self, dry_run: bool) -> None:
+        super().__init__(target_guild_id=self.GUILD)
+        self.dry_run = dry_run
+        self.job_started = False
+        self.cfg: Optional[RoleAssignmentConfig] = None
+        self.whitelist: Set[str] = set()
+
+    def set_config(self, cfg: RoleAssignmentConfig):
+        """Custom configurations"""
+        self.cfg = cfg
+        for path in self.cfg.whitelist_json_paths:
+            self.whitelist.update(str(k) for k in json.load(open(path, "r")))
+
+    async def manage_guild(self, guild: Guild):
+        """Use the gateway cache (chunked with intents.members) instead of re-fetching members over REST."""
+        self.roles = guild.roles
+        self.members = guild.members
+        await self.manage_members_post(self.members)
+
+    async def manage_members_post(self, members: List[Member]):
+        if self.cfg is None:
+            print("No RoleAssignmentConfig set, nothing to do.")
+            return
+        role = [r for r in self.roles if r.id == self.cfg.role_id]
+        if not role:
+            raise ValueError(f"No role {self.cfg.role_id} found, available: {self.roles}")
+        await self.assign_role(members, role[0], remove=self.cfg.remove)
+
+    def _match_whitelist(self, members: List[Member]) -> List[Member]:
+        matched = [m for m in members if (str(m.id) in self.whitelist) or (str(m) in self.whitelist)]
+        found = {str(m.id) for m in matched} | {str(m) for m in matched}
+        missing = self.whitelist - found
+        if missing:
+            print(f"{len(missing)} whitelisted users not found in guild, e.g. {sorted(missing)[:10]}")
+        return matched
+
+    def _check_can_edit_role(self, role: Role) -> None:
+        """Fail fast: a 403 here would repeat for every member and count towards Discord's invalid-request ban."""
+        me = self.guild.me
+        if not me.guild_permissions.manage_roles:
+            raise PermissionError(f"{me} lacks Manage Roles in {self.guild.name}")
+        if role.managed:
+            raise PermissionError(f"{role.name} is managed by an integration and cannot be assigned")
+        if not role < me.top_role:
+            raise PermissionError(f"{role.name} is not below {me}'s top role {me.top_role.name}")
+
+    async def assign_role(self, members: List[Member], role: Role, remove: bool = False) -> None:
+        """Grant (or revoke) `role` to whitelisted `members` whose cached role state differs.
+
+        Rerunning after an interruption skips members already holding (or lacking) the role.
+        """
+        self._check_can_edit_role(role)
+        todo = [m for m in self._match_whitelist(members) if (role in m.roles) == remove]
+        print(f"{'Remove' if remove else 'Add'} {role.name} for {len(todo)} members.")
+        if self.dry_run or not todo:
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for m in todo:
+            queue.put_nowait(m)
+        succeeded: Set[int] = set()
+        failed: Dict[int, str] = {}
+        stop = asyncio.Event()
+
+        async def worker():
+            while not stop.is_set() and not queue.empty():
+                m = queue.get_nowait()
+                try:
+                    error = await self._apply_role(m, role, remove)
+                except discord.errors.Forbidden as e:
+                    failed[m.id] = str(e)
+                    stop.set()
+                    return
+                except Exception as e:
+                    error = repr(e)
+                if error:
+                    failed[m.id] = error
+                    continue
+                succeeded.add(m.id)
+
+        await asyncio.gather(*[worker() for _ in range(min(self.MAX_CONCURRENCY, len(todo)))])
+        if stop.is_set():
+            print(f"Stopped on 403 Forbidden, {queue.qsize()} members left untouched.")
+        print(f"Done: {len(succeeded)} succeeded, {len(failed)} failed.")
+        for member_id, error in failed.items():
+            print(f"Failed {member_id}: {error}")
+
+    async def _apply_role(self, m: Member, role: Role, remove: bool) -> str:
+        """Return empty str on success, else the last error. Forbidden is raised to stop the whole run.
+
+        discord.py already retries 429 and 5xx itself; this only backs off on 5xx and network errors it gives up on.
+        """
+        error = ''
+        for attempt in range(self.MAX_ATTEMPTS):
+            try:
+                if remove:
+                    await m.remove_roles(role, reason="bulk role assignment")
+                else:
+                    await m.add_roles(role, reason="bulk role assignment")
+                return ''
+            except discord.errors.Forbidden:
+                raise
+            except (discord.errors.DiscordServerError, aiohttp.ClientError, OSError, asyncio.TimeoutError) as e:
+                error = str(e) or repr(e)
+                if attempt + 1 < self.MAX_ATTEMPTS:
+                    await asyncio.sleep(2 ** attempt)
+            except discord.errors.HTTPException as e:
+                return str(e)
+        return error
+
+
+class RoleAssignerClient(BasicClient, RoleAssigner):
+    """Multi-inhert from BasicClient and RoleAssigner to separate concerns:
+        Role assignment and Discord connection.
+
+    """
+    def __init__(self, *args, dry_run: bool = True, **kwargs):
+        BasicClient.__init__(self, *args, **kwargs)
+        RoleAssigner.__init__(self, dry_run=dry_run)
+
+    async def on_ready(self):
+        await BasicClient.on_ready(self)
+        if self.job_started:  # on_ready fires again after a reconnect that fails to resume
+            return
+        self.job_started = True
+        try:
+            await self.manage_guilds()
+        finally:
+            await self.close()
+
+    async def get_guilds(self) -> List[Guild]:
+        """Guilds from the gateway cache, so that member.roles resolves against the full role list."""
+        return self.guilds
+
+
+def main():
+    loop = asyncio.get_event_loop()
+    if loop.is_running():  # in notebook
+        client_loop = loop
+        print(client_loop)
+    else:
+        client_loop = None
+
+    intents = discord.Intents.default()
+    intents.members = True
+    client = RoleAssignerClient(loop=client_loop, intents=intents, dry_run=True)
+
+    role_config = RoleAssignmentConfig(
+        role_id=916492369715666985,  # DAOer
+        whitelist_json_paths=[
+            r'C:\Users\admin\Pictures\POAPs\WhatTheFork\discord_users_to_claim_url_map_T=2021-12-11 12:59.json',
+        ],
+    )
+    client.set_config(role_config)
+
+    client.run(MY_TOKEN)
+
+
+if __name__ == "__main__":
+    main()